@@ -1,61 +1,136 @@
 """
 Downloads the data in a zip file, reads its contents and generates a
-new csv file with the fields we need.
+new csv file with the fields we need, along with a typed Parquet copy.
+
+The zip file is never saved to disk, it is read straight from the download.
 """
 
-import csv
+import tempfile
+from multiprocessing import Pool
 from zipfile import ZipFile
 
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 import requests
 
+# The fields found in each of the yearly files.
+COLUMNS = ["name", "gender", "count"]
+
+# The schema of our dataset, names and genders are stored as dictionary encoded columns.
+SCHEMA = pa.schema([
+    ("year", pa.int16()),
+    ("name", pa.dictionary(pa.int32(), pa.string())),
+    ("gender", pa.dictionary(pa.int32(), pa.string())),
+    ("count", pa.int32())
+])
+
+# The options used to read the yearly files with the PyArrow csv reader.
+# The worker processes already run in parallel, so each read uses a single thread.
+READ_OPTIONS = pa_csv.ReadOptions(column_names=COLUMNS, use_threads=False)
+CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types={name: SCHEMA.field(name).type for name in COLUMNS})
+
+# The options used to write the csv file, the header is written by us so it isn't quoted.
+# Names never contain commas or quotes, so values are written without quotes.
+WRITE_OPTIONS = pa_csv.WriteOptions(include_header=False, quoting_style="none")
+
+# The size in bytes of each chunk read from the download stream (64 KiB).
+CHUNK_SIZE = 64 * 1024
+
+# The size in bytes the downloaded zip file can reach before it is moved to disk (64 MiB).
+SPOOL_SIZE = 64 * 1024 * 1024
+
 
 def download():
-    """Downloads the dataset and saves it to disk."""
+    """Downloads the dataset into a temporary file.
+
+    Returns
+    -------
+    tempfile.SpooledTemporaryFile
+        The zip file contents, rewound to the start.
+
+    """
 
     url = "https://www.ssa.gov/oact/babynames/names.zip"
 
-    with requests.get(url) as response:
+    # The zip file is kept in memory and only spills to disk if it grows past SPOOL_SIZE.
+    temp_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+
+    # We stream the response so it is written in chunks instead of being held in memory.
+    with requests.get(url, stream=True) as response:
+
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            temp_file.write(chunk)
+
+    temp_file.seek(0)
+    return temp_file
+
+
+def parse_year(year_file):
+    """Parses the contents of one of the yearly files.
+
+    Parameters
+    ----------
+    year_file : tuple
+        The file name and its raw contents as bytes.
+
+    Returns
+    -------
+    pyarrow.Table
+        The records of that year, with the year as the first column.
+
+    """
+
+    file_name, contents = year_file
+
+    # We read the file contents using the PyArrow csv reader.
+    table = pa_csv.read_csv(pa.BufferReader(contents), read_options=READ_OPTIONS,
+                            convert_options=CONVERT_OPTIONS)
+
+    # The year is taken from the file name and added as the first column.
+    year = pa.scalar(int(file_name[3:7]), pa.int16())
 
-        with open("names.zip", "wb") as temp_file:
-            temp_file.write(response.content)
+    return table.add_column(0, "year", pa.repeat(year, table.num_rows))
 
 
-def parse_zip():
-    """Reads the contents of the zip file and creates a csv file with them."""
+def parse_zip(zip_file):
+    """Reads the contents of the zip file and creates a csv file with them.
 
-    # This list will hold all our data. We initialize it with the header row.
-    data_list = [["year", "name", "gender", "count"]]
+    The yearly files are parsed in parallel by a pool of worker processes.
 
-    # We first read the zip file using a zipfile.ZipFile object.
-    with ZipFile("names.zip") as temp_zip:
+    Parameters
+    ----------
+    zip_file : file-like object
+        The zip file to be read.
 
-        # Then we read the file list.
-        for file_name in temp_zip.namelist():
+    """
 
-            # We will only process .txt files.
-            if ".txt" in file_name:
+    # We open the output files first so each year can be written as soon as it is parsed.
+    with open("data.csv", "wb") as csv_file, \
+            pq.ParquetWriter("data.parquet", SCHEMA, compression="zstd") as parquet_writer:
 
-                # Now we read the current file from the zip file.
-                with temp_zip.open(file_name) as temp_file:
+        # We start by writing the header row.
+        csv_file.write(",".join(SCHEMA.names).encode("utf-8") + b"\n")
 
-                    # The file is opened as binary, we decode it using utf-8 so it can be manipulated as a string.
-                    for line in temp_file.read().decode("utf-8").splitlines():
+        # We then read the zip file using a zipfile.ZipFile object.
+        # The csv writer appends the rows of each year after the header.
+        with pa_csv.CSVWriter(csv_file, SCHEMA, write_options=WRITE_OPTIONS) as csv_writer, \
+                ZipFile(zip_file) as temp_zip, Pool() as pool:
 
-                        # We prepare our desired data fields and add them to the data list.
-                        line_chunks = line.split(",")
-                        year = file_name[3:7]
-                        name = line_chunks[0]
-                        gender = line_chunks[1]
-                        count = line_chunks[2]
+            # We read the raw contents of each .txt file and send them to the workers.
+            year_files = ((file_name, temp_zip.read(file_name))
+                          for file_name in temp_zip.namelist() if file_name.endswith(".txt"))
 
-                        data_list.append([year, name, gender, count])
+            # imap() gives back the parsed years in the same order they were sent.
+            for table in pool.imap(parse_year, year_files):
 
-    # We save the data list into a csv file.
-    csv.writer(open("data.csv", "w", newline="",
-                    encoding="utf-8")).writerows(data_list)
+                # We append the current year to the csv and Parquet files.
+                csv_writer.write_table(table)
+                parquet_writer.write_table(table)
 
 
 if __name__ == "__main__":
 
-    download()
-    parse_zip()
+    with download() as zip_file:
+        parse_zip(zip_file)
@@ -2,6 +2,8 @@
 Functions used to generate the insights and plots from the article.
 """
 
+import os
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -20,8 +22,37 @@ sns.set(style="ticks",
             "figure.facecolor": "#443941"}
         )
 
+# The data types used when loading the csv file, they keep the DataFrame small
+# and let groupby operations work on integer codes instead of strings.
+DTYPES = {"year": "int16", "count": "int32",
+          "gender": "category", "name": "category"}
+
+
+def load_data():
+    """Loads the dataset, preferring the Parquet file over the csv file.
+
+    When only the csv file exists, a Parquet copy is saved so later runs
+    can skip parsing it.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataset with narrow data types.
+
+    """
+
+    # Parquet files written by step1 already have these types, the astype() call
+    # makes sure names are categorical even when the file was written by other means.
+    if os.path.exists("data.parquet"):
+        return pd.read_parquet("data.parquet").astype(DTYPES)
 
-def get_essentials(df):
+    df = pd.read_csv("data.csv", dtype=DTYPES)
+    df.to_parquet("data.parquet", index=False)
+
+    return df
+
+
+def get_essentials(df, male_df, female_df):
     """Gets total counts by gender.
 
     Parameters
@@ -29,6 +60,12 @@ def get_essentials(df):
     df : pandas.DataFrame
         The DataFrame to be analyzed.
 
+    male_df : pandas.DataFrame
+        The rows of df with male names.
+
+    female_df : pandas.DataFrame
+        The rows of df with female names.
+
     """
 
     # Top 5 rows.
@@ -41,65 +78,113 @@ def get_essentials(df):
     print(df["name"].nunique())
 
     # Unique names Male.
-    print(df[df["gender"] == "M"]["name"].nunique())
+    print(male_df["name"].nunique())
 
     # Unique names Female.
-    print(df[df["gender"] == "F"]["name"].nunique())
+    print(female_df["name"].nunique())
 
     # Unique names gender neutral.
-    both_df = df.pivot_table(
-        index="name", columns="gender", values="count", aggfunc=np.sum).dropna()
+    both_df = df.groupby(["name", "gender"], observed=True)[
+        "count"].sum().unstack("gender").dropna()
 
     print(both_df.index.nunique())
 
 
-def totals_by_year(df):
-    """Gets total counts by year.
+def get_totals_by_year(df):
+    """Gets the total counts by year for male, female and combined.
 
     Parameters
     ----------
     df : pandas.DataFrame
         The DataFrame to be analyzed.
 
+    Returns
+    -------
+    pandas.DataFrame
+        A DataFrame indexed by year with the both, male and female columns.
+
     """
 
-    both_df = df.groupby("year").sum()
-    male_df = df[df["gender"] == "M"].groupby("year").sum()
-    female_df = df[df["gender"] == "F"].groupby("year").sum()
+    # We sum the counts by year and gender in a single pass and move the genders to the columns.
+    gender_df = df.groupby(["year", "gender"], observed=True)[
+        "count"].sum().unstack("gender", fill_value=0)
 
-    print("Both Min:", both_df.min()["count"], "-", both_df.idxmin()["count"])
-    print("Both Max:", both_df.max()["count"], "-", both_df.idxmax()["count"])
-    print("Male Min:", male_df.min()["count"], "-", male_df.idxmin()["count"])
-    print("Male Max:", male_df.max()["count"], "-", male_df.idxmax()["count"])
-    print("Female Min:", female_df.min()[
-          "count"], "-", female_df.idxmin()["count"])
-    print("Female Max:", female_df.max()[
-          "count"], "-", female_df.idxmax()["count"])
+    return pd.DataFrame({
+        "both": gender_df.sum(axis=1),
+        "male": gender_df["M"],
+        "female": gender_df["F"]
+    })
 
 
-def get_top_10(df):
-    """Gets the top 10 most used male and female names.
+def get_percentages_by_year(df):
+    """Gets the percentage of each name by year, used by the growth plots.
 
     Parameters
     ----------
     df : pandas.DataFrame
         The DataFrame to be analyzed.
 
+    Returns
+    -------
+    pandas.DataFrame
+        A DataFrame with the names as the index and the years as the columns.
+
+    """
+
+    # We merge values from male and female and pivot the table
+    # so the names are our index and the years are our columns.
+    # We also fill missing values with zeroes.
+    pivoted_df = df.groupby(["name", "year"], observed=True)[
+        "count"].sum().unstack("year", fill_value=0)
+
+    # Then we calculate the percentage of each name by year.
+    return pivoted_df / pivoted_df.sum() * 100
+
+
+def totals_by_year(totals_df):
+    """Gets total counts by year.
+
+    Parameters
+    ----------
+    totals_df : pandas.DataFrame
+        The DataFrame returned by get_totals_by_year().
+
     """
 
-    # We create a new dataframe with only male names and sum all their counts.
-    # Then we sort it in descending order.
-    male_df = df[df["gender"] == "M"][["name", "count"]].groupby(
-        "name").sum().sort_values("count", ascending=False)
+    # We work on one column Series at a time so each reduction only reads that column.
+    for label, column in [("Both", "both"), ("Male", "male"), ("Female", "female")]:
+        totals = totals_df[column]
+
+        print(label, "Min:", totals.min(), "-", totals.idxmin())
+        print(label, "Max:", totals.max(), "-", totals.idxmax())
+
+
+def get_top_10(male_df, female_df):
+    """Gets the top 10 most used male and female names.
 
-    print(male_df.head(10))
+    Parameters
+    ----------
+    male_df : pandas.DataFrame
+        The DataFrame with male names to be analyzed.
 
-    # We create a new dataframe with only female names and sum all their counts.
-    # Then we sort it in descending order.
-    female_df = df[df["gender"] == "F"][["name", "count"]].groupby(
-        "name").sum().sort_values("count", ascending=False)
+    female_df : pandas.DataFrame
+        The DataFrame with female names to be analyzed.
 
-    print(female_df.head(10))
+    """
+
+    # We sum all the counts of the male names.
+    # Then we take the 10 largest ones without sorting the whole dataframe.
+    top_male_df = male_df[["name", "count"]].groupby(
+        "name", observed=True).sum().nlargest(10, "count")
+
+    print(top_male_df)
+
+    # We sum all the counts of the female names.
+    # Then we take the 10 largest ones without sorting the whole dataframe.
+    top_female_df = female_df[["name", "count"]].groupby(
+        "name", observed=True).sum().nlargest(10, "count")
+
+    print(top_female_df)
 
 
 def get_top_20_gender_neutral(df):
@@ -113,151 +198,148 @@ def get_top_20_gender_neutral(df):
     """
 
     # We pivot the dataframe so the names will be the index and the genders will be the columns.
-    df = df.pivot_table(index="name", columns="gender",
-                        values="count", aggfunc=np.sum).dropna()
+    df = df.groupby(["name", "gender"], observed=True)[
+        "count"].sum().unstack("gender").dropna()
 
     # Limit to only names with at least 50,000 records on both genders.
     df = df[(df["M"] >= 50000) & (df["F"] >= 50000)]
     print(df.head(20))
 
 
-def plot_counts_by_year(df):
+def plot_counts_by_year(totals_df):
     """Plots the year counts by male, female and combined.
 
     Parameters
     ----------
-    df : pandas.DataFrame
-        The DataFrame to be plotted.
+    totals_df : pandas.DataFrame
+        The DataFrame returned by get_totals_by_year().
 
     """
 
-    # We create new dataframes for male, female and combined.
-    both_df = df.groupby("year").sum()
-    male_df = df[df["gender"] == "M"].groupby("year").sum()
-    female_df = df[df["gender"] == "F"].groupby("year").sum()
+    # Each plot gets its own figure so it can be closed once it is saved.
+    fig, ax = plt.subplots()
 
-    # We plot our dataframes directly.
+    # We plot our columns directly.
     # The x-axis will be the index and the y-axis will be the total counts.
-    plt.plot(both_df, label="Both", color="yellow")
-    plt.plot(male_df, label="Male", color="lightblue")
-    plt.plot(female_df, label="Female", color="pink")
+    ax.plot(totals_df["both"], label="Both", color="yellow")
+    ax.plot(totals_df["male"], label="Male", color="lightblue")
+    ax.plot(totals_df["female"], label="Female", color="pink")
 
     # We make our yticks in steps of 50,000.
     # First we format the numbers for the labels.
     # Then we use the actual numbers as the steps.
     yticks_labels = ["{:,}".format(i) for i in range(0, 4500000+1, 500000)]
-    plt.yticks(np.arange(0, 4500000+1, 500000), yticks_labels)
+    ax.set_yticks(np.arange(0, 4500000+1, 500000))
+    ax.set_yticklabels(yticks_labels)
 
     # Final customizations.
-    plt.legend()
-    plt.grid(False)
-    plt.xlabel("Year")
-    plt.ylabel("Records Count")
-    plt.title("Records per Year")
-    plt.savefig("total_by_year.png", facecolor="#443941")
+    ax.legend()
+    ax.grid(False)
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Records Count")
+    ax.set_title("Records per Year")
+    fig.savefig("total_by_year.png", facecolor="#443941")
+    plt.close(fig)
 
 
-def plot_popular_names_growth(df):
+def plot_popular_names_growth(percentage_df):
     """Plots the most popular names and how they have grown trough the years.
 
     Parameters
     ----------
-    df : pandas.DataFrame
-        The DataFrame to be plotted.
+    percentage_df : pandas.DataFrame
+        The DataFrame returned by get_percentages_by_year().
 
     """
 
-    # We first pivot the dataframe to merge values from male and female and
-    # pivot the table so the names are our index and the years are our columns.
-    # We also fill missing values with zeroes.
-    pivoted_df = df.pivot_table(
-        index="name", columns="year", values="count", aggfunc=np.sum).fillna(0)
-
-    # Then we calculate the percentage of each name by year.
-    percentage_df = pivoted_df / pivoted_df.sum() * 100
-
-    # We add a new column to store the cumulative percentages sum.
-    percentage_df["total"] = percentage_df.sum(axis=1)
-
-    # We sort the dataframe to check which are the top values and slice it.
-    # After that we drop the 'total' column since it won't be used anymore.
-    sorted_df = percentage_df.sort_values(
-        by="total", ascending=False).drop("total", axis=1)[0:10]
+    # We take the 10 names with the largest cumulative percentages sum
+    # and slice the dataframe with them, in descending order.
+    top_names = percentage_df.sum(axis=1).nlargest(10).index
+    sorted_df = percentage_df.loc[top_names]
 
     # We flip the axes so we can plot the data more easily.
     transposed_df = sorted_df.transpose()
 
+    # We create a new figure for this plot, it is closed after being saved.
+    fig, ax = plt.subplots()
+
     # We plot each name individually by using the column name as the label and Y-axis.
     for name in transposed_df.columns.tolist():
-        plt.plot(transposed_df.index, transposed_df[name], label=name)
+        ax.plot(transposed_df.index, transposed_df[name], label=name)
 
     # We set our yticks in steps of 0.5.
     yticks_labels = ["{}%".format(i) for i in np.arange(0, 5.5, 0.5)]
-    plt.yticks(np.arange(0, 5.5, 0.5), yticks_labels)
+    ax.set_yticks(np.arange(0, 5.5, 0.5))
+    ax.set_yticklabels(yticks_labels)
 
     # Final customizations.
-    plt.legend()
-    plt.grid(False)
-    plt.xlabel("Year")
-    plt.ylabel("Percentage by Year")
-    plt.title("Top 10 Names Growth")
-    plt.savefig("most_popular_growth.png", facecolor="#443941")
+    ax.legend()
+    ax.grid(False)
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Percentage by Year")
+    ax.set_title("Top 10 Names Growth")
+    fig.savefig("most_popular_growth.png", facecolor="#443941")
+    plt.close(fig)
 
 
-def plot_top_10_trending(df):
+def plot_top_10_trending(percentage_df):
     """Plots the most populare names and how they have grown trough the years.
 
     Parameters
     ----------
-    df : pandas.DataFrame
-        The DataFrame to be plotted.
+    percentage_df : pandas.DataFrame
+        The DataFrame returned by get_percentages_by_year().
 
     """
 
-    # First we remove all records previous to 2008.
-    filtered_df = df[df["year"] >= 2008]
-    
-    # Then we merge values from male and female and pivot the table
-    # so the names are our index and the years are our columns.
-    # We also fill missing values with zeroes.
-    pivoted_df = filtered_df.pivot_table(
-        index="name", columns="year", values="count", aggfunc=np.sum).fillna(0)
-
-    # Then we calculate the percentage of each name by year.
-    percentage_df = pivoted_df / pivoted_df.sum() * 100
-
-    # We add a new column to store the cumulative percentages sum.
-    percentage_df["total"] = percentage_df.sum(axis=1)
+    # First we remove all the years previous to 2008.
+    # The percentages of each year don't depend on other years, so they can be reused as they are.
+    percentage_df = percentage_df.loc[:, percentage_df.columns >= 2008]
 
-    # We sort the dataframe to check which are the top values and slice it.
-    # After that we drop the 'total' column since it won't be used anymore.
-    sorted_df = percentage_df.sort_values(
-        by="total", ascending=False).drop("total", axis=1)[0:10]
+    # We take the 10 names with the largest cumulative percentages sum
+    # and slice the dataframe with them, in descending order.
+    top_names = percentage_df.sum(axis=1).nlargest(10).index
+    sorted_df = percentage_df.loc[top_names]
 
     # We flip the axes so we can plot the dataframe more easily.
     transposed_df = sorted_df.transpose()
 
+    # We create a new figure for this plot, it is closed after being saved.
+    fig, ax = plt.subplots()
+
     # We plot each name individually by using the column name as the label and Y-axis.
     for name in transposed_df.columns.tolist():
-        plt.plot(transposed_df.index, transposed_df[name], label=name)
+        ax.plot(transposed_df.index, transposed_df[name], label=name)
 
     # We set our yticks in steps of 0.05%.
     yticks_labels = ["{:.2f}%".format(i) for i in np.arange(0.3, 0.7, 0.05)]
-    plt.yticks(np.arange(0.3, 0.7, 0.05), yticks_labels)
+    ax.set_yticks(np.arange(0.3, 0.7, 0.05))
+    ax.set_yticklabels(yticks_labels)
 
     # We set our xticks in steps of 1, from 2009 to 2018.
-    xticks_labels = ["{}".format(i) for i in range(2008, 2618+1, 1)]
-    plt.xticks(np.arange(2008, 2018+1, 1), xticks_labels)
+    xticks_labels = ["{}".format(i) for i in range(2008, 2018+1, 1)]
+    ax.set_xticks(np.arange(2008, 2018+1, 1))
+    ax.set_xticklabels(xticks_labels)
 
     # Final customizations.
-    plt.legend()
-    plt.grid(False)
-    plt.xlabel("Year")
-    plt.ylabel("Percentage by Year")
-    plt.title("Top 10 Trending Names")
-    plt.savefig("trending_names.png", facecolor="#443941")
+    ax.legend()
+    ax.grid(False)
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Percentage by Year")
+    ax.set_title("Top 10 Trending Names")
+    fig.savefig("trending_names.png", facecolor="#443941")
+    plt.close(fig)
 
 
 if __name__ == "__main__":
 
-    main_df = pd.read_csv("data.csv")
+    main_df = load_data()
+
+    # We split the dataset by gender only once so the functions can reuse it.
+    # The data only has the M and F genders, so the inverted mask gives the female rows.
+    male_mask = (main_df["gender"] == "M").values
+    male_df = main_df.loc[male_mask]
+    female_df = main_df.loc[~male_mask]
+
+    totals_df = get_totals_by_year(main_df)
+    percentage_df = get_percentages_by_year(main_df)